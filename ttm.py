@@ -7,21 +7,21 @@
 # Copyright (c) 2022 Yuri Escalianti <yuriescl@gmail.com>
 # Homepage: https://github.com/yuriescl/ttm
 
-from datetime import datetime
-from fcntl import LOCK_EX, LOCK_UN, lockf
+from fcntl import LOCK_EX, LOCK_SH, LOCK_UN, flock
+from functools import lru_cache
 import io
 from io import SEEK_END, SEEK_SET
-import json
-from multiprocessing.dummy import Pool as ThreadPool
+import mmap
 import os
-from os.path import abspath, join
+from os.path import join
 from pathlib import Path
 import re
+from select import select
 import shlex
 from shutil import get_terminal_size, rmtree
 from signal import SIGINT, SIGKILL, SIGTERM, Signals, signal
 from subprocess import DEVNULL, Popen, check_output
-from sys import argv, exit, stderr, stdout, version_info
+from sys import argv, exit, intern, stderr, stdout, version_info
 import tempfile
 import time
 from time import sleep
@@ -30,19 +30,53 @@ from typing import Dict, List, Optional, Tuple, Union
 if version_info[0] < 3 or version_info[1] < 8:
     raise Exception("Python >=3.8 is required to run this program")
 
+JSON_FUNCS = None
+
+
+def get_json_funcs():
+    # Resolved on first task.json read/write so that invocations that
+    # never touch the cache don't pay the json/orjson import cost.
+    # orjson is optional and speeds up parsing/serialization when
+    # installed.
+    global JSON_FUNCS
+    if JSON_FUNCS is None:
+        try:
+            import orjson
+
+            JSON_FUNCS = (orjson.loads, orjson.dumps)
+        except ImportError:
+            import json
+
+            JSON_FUNCS = (json.loads, lambda obj: json.dumps(obj).encode())
+    return JSON_FUNCS
+
+
+def json_loads(data: bytes):
+    return get_json_funcs()[0](data)
+
+
+def json_dumps(obj) -> bytes:
+    return get_json_funcs()[1](obj)
+
 
 LOCK_FILE_NAME = "lock"
 CACHE_DIR = Path.home() / ".ttm"
 LOCK_PATH = Path(CACHE_DIR / LOCK_FILE_NAME)
 
-RESERVED_FILE_NAMES = [LOCK_FILE_NAME]
+NEXT_ID_FILE_NAME = ".next_id"
+
+RESERVED_FILE_NAMES = [LOCK_FILE_NAME, NEXT_ID_FILE_NAME]
 
 VERSION = "0.14.0"
 BUSY_LOOP_INTERVAL = 0.1  # seconds
 TIMESTAMP_FMT = "%Y%m%d%H%M%S"
+NAME_RE = re.compile(r"\A[a-zA-Z_]+\Z")
+SAFE_ARG_RE = re.compile(r"\A[-\w./=:]+\Z")
 
 TERMINATE = False
 
+HAS_PROC = os.path.isdir("/proc")
+
 Task = dict
 
 
@@ -59,8 +93,9 @@ class Tailer(object):
     """
 
     LINE_TERMINATORS = (b"\r\n", b"\n", b"\r")
+    LINE_TERMINATOR_RE = re.compile(b"\r\n|\n|\r")
 
-    def __init__(self, file, read_size=1024, end=False):
+    def __init__(self, file, read_size=65536, end=False):
         if not isinstance(file, io.IOBase) or isinstance(file, io.TextIOBase):
             raise ValueError("io object must be in the binary mode")
 
@@ -71,7 +106,7 @@ class Tailer(object):
             self.file.seek(0, SEEK_END)
 
     def splitlines(self, data):
-        return re.split(b"|".join(self.LINE_TERMINATORS), data)
+        return self.LINE_TERMINATOR_RE.split(data)
 
     def read(self, read_size=-1):
         read_str = self.file.read(read_size)
@@ -115,13 +150,23 @@ class Tailer(object):
                 else:
                     self.file.seek(terminator_where)
 
-            while data_where < data_len:
-                terminator = self.prefix_line_terminator(data[data_where:])
-                if terminator:
-                    self.file.seek(where + offset + data_where + len(terminator))
-                    return self.file.tell()
+            # Find the first terminator with C-level find() instead of
+            # scanning the block one byte at a time.
+            idx_n = data.find(b"\n")
+            idx_r = data.find(b"\r")
+            if idx_n < 0:
+                idx = idx_r
+            elif idx_r < 0:
+                idx = idx_n
+            else:
+                idx = min(idx_n, idx_r)
+            if idx >= 0:
+                if data[idx] == b"\r"[0] and idx + 1 < data_len and data[idx + 1] == b"\n"[0]:
+                    terminator_len = 2
                 else:
-                    data_where += 1
+                    terminator_len = 1
+                self.file.seek(where + offset + idx + terminator_len)
+                return self.file.tell()
 
             offset += data_len
             self.file.seek(where + offset)
@@ -157,16 +202,21 @@ class Tailer(object):
 
             data_where = data_len
 
+            # Find the last terminator with C-level rfind() instead of
+            # re-slicing the block one byte at a time.
             while data_where > 0:
-                terminator = self.suffix_line_terminator(data[:data_where])
-                if terminator and offset == 0 and data_where == data_len:
+                idx = max(data.rfind(b"\n", 0, data_where), data.rfind(b"\r", 0, data_where))
+                if idx < 0:
+                    break
+                if offset == 0 and idx + 1 == data_len:
                     # The last character is a line terminator that finishes current line. Ignore it.
-                    data_where -= len(terminator)
-                elif terminator:
-                    self.file.seek(where - offset - (data_len - data_where))
-                    return self.file.tell()
+                    if data[idx] == b"\n"[0] and idx > 0 and data[idx - 1] == b"\r"[0]:
+                        data_where = idx - 1
+                    else:
+                        data_where = idx
                 else:
-                    data_where -= 1
+                    self.file.seek(where - offset - (data_len - idx - 1))
+                    return self.file.tell()
 
             offset += data_len
 
@@ -178,7 +228,52 @@ class Tailer(object):
             self.file.seek(0)
             return 0
 
+    def _mmap(self):
+        try:
+            return mmap.mmap(self.file.fileno(), 0, prot=mmap.PROT_READ)
+        except (ValueError, OSError):
+            # Empty file or an object without a real file descriptor
+            return None
+
     def tail(self, lines=10):
+        mm = self._mmap()
+        if mm is None:
+            return self._tail_read(lines)
+        with mm:
+            end = len(mm)
+            pos = end
+            # A terminator that finishes the last line only separates it
+            # from an empty string; skip it before counting lines back.
+            if pos > 0 and mm[pos - 1] == b"\n"[0]:
+                pos -= 1
+                if pos > 0 and mm[pos - 1] == b"\r"[0]:
+                    pos -= 1
+            elif pos > 0 and mm[pos - 1] == b"\r"[0]:
+                pos -= 1
+            start = end if lines <= 0 else 0
+            for _ in range(lines):
+                idx = max(mm.rfind(b"\n", 0, pos), mm.rfind(b"\r", 0, pos))
+                if idx < 0:
+                    start = 0
+                    break
+                start = idx + 1
+                if mm[idx] == b"\n"[0] and idx > 0 and mm[idx - 1] == b"\r"[0]:
+                    pos = idx - 1
+                else:
+                    pos = idx
+            data = mm[start:end]
+
+        for t in self.LINE_TERMINATORS:
+            if data.endswith(t):
+                data = data[: -len(t)]
+                break
+
+        if data:
+            return self.splitlines(data)
+        else:
+            return []
+
+    def _tail_read(self, lines=10):
         self.file.seek(0, SEEK_END)
 
         for i in range(lines):
@@ -200,6 +295,62 @@ class Tailer(object):
             return []
 
     def head(self, lines=10):
+        mm = self._mmap()
+        if mm is None:
+            return self._head_read(lines)
+        with mm:
+            size = len(mm)
+            if lines < 0:
+                pos = size
+                if pos > 0 and mm[pos - 1] == b"\n"[0]:
+                    pos -= 1
+                    if pos > 0 and mm[pos - 1] == b"\r"[0]:
+                        pos -= 1
+                elif pos > 0 and mm[pos - 1] == b"\r"[0]:
+                    pos -= 1
+                end_pos = size
+                for _ in range(-lines):
+                    idx = max(mm.rfind(b"\n", 0, pos), mm.rfind(b"\r", 0, pos))
+                    if idx < 0:
+                        end_pos = 0
+                        break
+                    end_pos = idx + 1
+                    if mm[idx] == b"\n"[0] and idx > 0 and mm[idx - 1] == b"\r"[0]:
+                        pos = idx - 1
+                    else:
+                        pos = idx
+            else:
+                pos = 0
+                for _ in range(lines):
+                    idx_n = mm.find(b"\n", pos)
+                    idx_r = mm.find(b"\r", pos)
+                    if idx_n < 0:
+                        idx = idx_r
+                    elif idx_r < 0:
+                        idx = idx_n
+                    else:
+                        idx = min(idx_n, idx_r)
+                    if idx < 0:
+                        pos = size
+                        break
+                    if mm[idx] == b"\r"[0] and idx + 1 < size and mm[idx + 1] == b"\n"[0]:
+                        pos = idx + 2
+                    else:
+                        pos = idx + 1
+                end_pos = pos
+            data = mm[0:end_pos]
+
+        for t in self.LINE_TERMINATORS:
+            if data.endswith(t):
+                data = data[: -len(t)]
+                break
+
+        if data:
+            return self.splitlines(data)
+        else:
+            return []
+
+    def _head_read(self, lines=10):
         if lines < 0:
             self.file.seek(0, SEEK_END)
             for i in range(-lines):
@@ -260,39 +411,87 @@ class Tailer(object):
                 yield None
 
 
-class AtomicOpen:
-    """https://stackoverflow.com/a/46407326/3705710"""
+class LogWatcher:
+    """
+    Blocks until a file is modified, so that following a quiet log idles
+    instead of polling. Uses inotify via ctypes on Linux; anywhere the
+    inotify calls are unavailable it falls back to a short sleep.
+    """
 
-    def __init__(self, path, *args, noop=False, **kwargs):
-        if noop is False:
-            self.file = open(path, *args, **kwargs)
-            self.lock_file(self.file)
-        self.noop = noop
+    IN_MODIFY = 0x00000002
+    IN_MOVE_SELF = 0x00000800
+
+    def __init__(self, path):
+        self.fd = None
+        try:
+            import ctypes
+            import ctypes.util
+
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(0)
+            if fd < 0:
+                return
+            wd = libc.inotify_add_watch(fd, os.fsencode(path), self.IN_MODIFY | self.IN_MOVE_SELF)
+            if wd < 0:
+                os.close(fd)
+                return
+            self.fd = fd
+        except (OSError, AttributeError):
+            self.fd = None
+
+    def wait(self, timeout=1.0):
+        if self.fd is None:
+            time.sleep(0.01)
+            return
+        readable, _, _ = select([self.fd], [], [], timeout)
+        if readable:
+            # Drain the queued events; their content doesn't matter, only
+            # that the file changed
+            os.read(self.fd, 4096)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
 
-    @staticmethod
-    def lock_file(f):
-        if f.writable():
-            lockf(f, LOCK_EX)
 
-    @staticmethod
-    def unlock_file(f):
-        if f.writable():
-            lockf(f, LOCK_UN)
+LOCK_FDS: Dict[str, int] = {}
 
-    def __enter__(self, *args, **kwargs):
+
+def get_lock_fd(path) -> int:
+    # The lock file descriptor is opened once per process and reused; it
+    # stays open until the process exits, which also releases the lock
+    fd = LOCK_FDS.get(str(path))
+    if fd is None:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        LOCK_FDS[str(path)] = fd
+    return fd
+
+
+class AtomicOpen:
+    """
+    Mutual exclusion between ttm processes via fcntl.flock on a lock file.
+    Nothing is ever written to the lock file, so acquiring and releasing
+    is a single syscall each - no open/flush/fsync/close per section.
+    """
+
+    def __init__(self, path, shared=False, noop=False):
+        self.path = path
+        self.shared = shared
+        self.noop = noop
+
+    def __enter__(self):
         if self.noop is False:
-            return self.file
+            # Shared lock: concurrent readers don't serialize each other
+            flock(get_lock_fd(self.path), LOCK_SH if self.shared else LOCK_EX)
 
     def __exit__(self, exc_type=None, exc_value=None, traceback=None):
         if self.noop is False:
-            self.file.flush()
-            os.fsync(self.file.fileno())
-            self.unlock_file(self.file)
-            self.file.close()
-            if exc_type is not None:
-                return False
-            else:
-                return True
+            flock(get_lock_fd(self.path), LOCK_UN)
+        if exc_type is not None:
+            return False
+        else:
+            return True
 
 
 class bcolors:
@@ -314,149 +513,142 @@ class bcolors:
 # ARG PARSING
 
 
+OPTIONS = frozenset({"run", "start", "stop", "rm", "ls", "logs"})
+
+SIGNAL_ARGS = frozenset(str(sig.value) for sig in Signals)
+
+ARGS_WITH_VALUE = {
+    None: frozenset({"cache-dir"}),
+    "run": frozenset({"cache-dir", "n", "name"}),
+    "start": frozenset({"cache-dir"}),
+    "stop": frozenset({"cache-dir"}),
+    "rm": frozenset({"cache-dir"}),
+    "ls": frozenset({"cache-dir"}),
+    "logs": frozenset({"cache-dir"}),
+}
+
+ARGS_WITHOUT_VALUE = {
+    None: frozenset({"h", "help", "version"}),
+    "run": frozenset({"h", "help", "s", "shell", "split-output"}),
+    "start": frozenset({"h", "help"}),
+    "stop": frozenset({"h", "help", "k", "kill"}) | SIGNAL_ARGS,
+    "rm": frozenset({"h", "help", "a", "all"}),
+    "ls": frozenset({"h", "help", "a", "all"}),
+    "logs": frozenset({"h", "help", "f", "follow", "head"}),
+}
+
+
+# Shared read-only result for parses that carry no flags
+NO_ARGS: Dict[str, Union[str, bool]] = {}
+
+
 def arg_requires_value(arg: str, option: Optional[str] = None) -> bool:
     def dashes(a: str):
         return "-" if len(a) == 1 else "--"
 
-    if arg in ["cache-dir"]:
+    if arg in ARGS_WITH_VALUE.get(option, frozenset()):
         return True
-    if arg in ["h", "help"]:
+    if arg in ARGS_WITHOUT_VALUE.get(option, frozenset()):
         return False
-    if option is None:
-        if arg in ["version"]:
-            return False
-    elif option == "run":
-        if arg in ["s", "shell", "split-output"]:
-            return False
-        if arg in ["n", "name"]:
-            return True
-    elif option == "start":
-        pass
-    elif option == "stop":
-        if arg in ["k", "kill"] + signals_list():
-            return False
-    elif option == "rm":
-        if arg in ["a", "all"]:
-            return False
-    elif option == "ls":
-        if arg in ["a", "all"]:
-            return False
-    elif option == "logs":
-        if arg in ["f", "follow", "head"]:
-            return False
     raise TtmException(f"Unrecognized argument {dashes(arg)}{arg}")
 
 
-def is_value_next(args: List[str], pos: int) -> bool:
-    return pos + 1 < len(args) and not args[pos + 1].startswith("-")
+def consume_arg(
+    args: List[str],
+    pos: int,
+    option: Optional[str],
+    target: Dict[str, Union[str, bool]],
+) -> int:
+    """
+    Consume the -/-- argument at args[pos] into target and return the
+    position of the next unread argument. Shared by both parsing phases
+    of parse_args.
+    """
+    current_arg = args[pos]
+    # Read the candidate value once; it is a value only if it exists and
+    # doesn't look like another flag
+    value = args[pos + 1] if pos + 1 < len(args) else None
+    if value is not None and value[:1] == "-":
+        value = None
+    if current_arg[:2] == "--":
+        # Interned names make the frozenset/dict lookups below pointer
+        # comparisons against the canonical literals
+        current_arg = intern(current_arg[2:])
+        if arg_requires_value(current_arg, option):
+            if value is None:
+                raise TtmException(f"Argument --{current_arg} requires a value")
+            target[current_arg] = value
+            return pos + 2
+        target[current_arg] = True
+        return pos + 1
+    current_arg = intern(current_arg[1:])
+    if len(current_arg) == 1:
+        if arg_requires_value(current_arg, option):
+            if value is None:
+                raise TtmException(f"Argument -{current_arg} requires a value")
+            target[current_arg] = value
+            return pos + 2
+        target[current_arg] = True
+        return pos + 1
+    for letter in current_arg:
+        if arg_requires_value(letter, option):
+            raise TtmException(
+                f"Argument -{letter} cannot be grouped with other arguments"
+            )
+        target[letter] = True
+    return pos + 1
 
 
 def parse_args(
     args_to_parse: List[str],
 ) -> Tuple[Dict, Optional[str], Dict, Optional[List[str]]]:
     args = args_to_parse[1:]
-    global_args: Dict[str, Union[str, bool]] = {}
+    n = len(args)
+    # Callers only ever read the returned dicts, so invocations without
+    # flags (the common case) can share one empty dict instead of
+    # allocating two fresh ones per parse
+    global_args: Optional[Dict[str, Union[str, bool]]] = None
     option = None
     pos = 0
-    while True:
-        if pos >= len(args):
-            break
+    while pos < n:
         current_arg = args[pos]
-        if current_arg in ["run", "start", "stop", "rm", "ls", "logs"]:
+        if current_arg in OPTIONS:
             option = current_arg
             pos += 1
             break
-        elif current_arg.startswith("--"):
-            current_arg = current_arg[2:]
-            if arg_requires_value(current_arg, option):
-                if not is_value_next(args, pos):
-                    raise TtmException(f"Argument --{current_arg} requires a value")
-                global_args[current_arg] = args[pos + 1]
-                pos += 2
-                continue
-            else:
-                global_args[current_arg] = True
-                pos += 1
-                continue
-        elif current_arg.startswith("-"):
-            current_arg = current_arg[1:]
-            if len(current_arg) == 1:
-                if arg_requires_value(current_arg, option):
-                    if not is_value_next(args, pos):
-                        raise TtmException(f"Argument -{current_arg} requires a value")
-                    global_args[current_arg] = args[pos + 1]
-                    pos += 2
-                    continue
-                else:
-                    global_args[current_arg] = True
-                    pos += 1
-                    continue
-            else:
-                for letter in current_arg:
-                    if arg_requires_value(letter, option):
-                        raise TtmException(
-                            f"Argument -{letter} cannot be grouped with other arguments"
-                        )
-                    global_args[letter] = True
-                    pos += 1
-                    continue
+        elif current_arg[:1] == "-":
+            if global_args is None:
+                global_args = {}
+            pos = consume_arg(args, pos, option, global_args)
         else:
             raise TtmException(f"Unrecognized option {current_arg}")
-        pos += 1
 
-    option_args: Dict[str, Union[str, bool]] = {}
+    option_args: Optional[Dict[str, Union[str, bool]]] = None
     command = None
 
     if option is not None:
-        if pos >= len(args) and option not in ["ls"]:
+        if pos >= n and option != "ls":
             raise TtmException(f"Missing arguments for option '{option}'")
-        while True:
-            if pos >= len(args):
-                break
-            current_arg = args[pos]
-            if current_arg.startswith("--"):
-                current_arg = current_arg[2:]
-                if arg_requires_value(current_arg, option):
-                    if not is_value_next(args, pos):
-                        raise TtmException(f"Argument --{current_arg} requires a value")
-                    option_args[current_arg] = args[pos + 1]
-                    pos += 2
-                    continue
-                else:
-                    option_args[current_arg] = True
-                    pos += 1
-                    continue
-            elif current_arg.startswith("-"):
-                current_arg = current_arg[1:]
-                if len(current_arg) == 1:
-                    if arg_requires_value(current_arg, option):
-                        if not is_value_next(args, pos):
-                            raise TtmException(
-                                f"Argument -{current_arg} requires a value"
-                            )
-                        option_args[current_arg] = args[pos + 1]
-                        pos += 2
-                        continue
-                    else:
-                        option_args[current_arg] = True
-                        pos += 1
-                        continue
+        if pos < n and args[pos][:1] != "-":
+            # Common case: the option is immediately followed by the
+            # command, no option flags to parse
+            command = args[pos:]
+        else:
+            while pos < n:
+                if args[pos][:1] == "-":
+                    if option_args is None:
+                        option_args = {}
+                    pos = consume_arg(args, pos, option, option_args)
                 else:
-                    for letter in current_arg:
-                        if arg_requires_value(letter, option) and not is_value_next(
-                            args, pos
-                        ):
-                            raise TtmException(
-                                f"Argument -{letter} cannot be grouped with other arguments"
-                            )
-                        option_args[letter] = True
-                        pos += 1
-                        continue
-            else:
-                command = args[pos:]
-                break
+                    command = args[pos:]
+                    break
 
-    return global_args, option, option_args, command
+    return (
+        global_args if global_args is not None else NO_ARGS,
+        option,
+        option_args if option_args is not None else NO_ARGS,
+        command,
+    )
 
 
 ##################
@@ -468,36 +660,66 @@ def init_cache_dir(cache_dir: Optional[Union[str, Path]]):
     global LOCK_PATH
     if cache_dir is not None:
         CACHE_DIR = Path(cache_dir)
-    os.makedirs(CACHE_DIR, exist_ok=True)
+    try:
+        # One syscall in the common case where the directory exists
+        os.mkdir(CACHE_DIR)
+    except FileExistsError:
+        pass
+    except FileNotFoundError:
+        # Missing parents (e.g. a nested --cache-dir)
+        os.makedirs(CACHE_DIR, exist_ok=True)
     LOCK_FILE_NAME = "lock"
     LOCK_PATH = Path(CACHE_DIR / LOCK_FILE_NAME)
-    LOCK_PATH.touch(exist_ok=True)
+    # The lock file itself is created on first lock (get_lock_fd uses
+    # O_CREAT), no need to touch it here
 
 
 def get_task_label(task: Task):
-    if task["name"] is not None:
-        return f"{task['name']}-{task['id']}"
-    else:
-        return task["id"]
+    # Cached on the task dict; name and id never change after creation
+    label = task.get("_label")
+    if label is None:
+        if task["name"] is not None:
+            label = f"{task['name']}-{task['id']}"
+        else:
+            label = task["id"]
+        task["_label"] = label
+    return label
 
 
 def parse_task_id_or_name(task_name_or_id: str) -> Tuple[Optional[str], Optional[str]]:
-    try:
-        task_id = str(int(task_name_or_id))
-        name = None
-    except (ValueError, TypeError):
-        task_id = None
-        name = task_name_or_id
-    return task_id, name
+    if task_name_or_id.isdigit():
+        return task_name_or_id, None
+    return None, task_name_or_id
 
 
 def create_pidfile(task: Task):
-    if task.get("pid") is not None:
+    pid = task.get("pid")
+    if pid is not None:
         if task.get("pidfile"):
+            if task.get("_pidfile_pid") == pid:
+                # PID unchanged since the pidfile was last written or
+                # read; skip the redundant rewrite
+                return
             Path(task["pidfile"]).unlink(missing_ok=True)
         fh, task["pidfile"] = tempfile.mkstemp()
         with os.fdopen(fh, "w") as f:
-            f.write(task["pid"])
+            f.write(pid)
+        task["_pidfile_pid"] = pid
+
+
+def write_task_file(filepath: Union[str, Path], task: Task):
+    # Write to a temp file and rename so a crash mid-write can't leave a
+    # corrupt task.json behind (rename is atomic on POSIX)
+    tmp_path = f"{filepath}.tmp"
+    task_to_dump = dict(task)
+    task_to_dump.pop("pid", None)
+    task_to_dump.pop("_pidfile_pid", None)
+    task_to_dump.pop("_label", None)
+    with open(tmp_path, "wb") as f:
+        f.write(json_dumps(task_to_dump))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
 
 
 def create_task_cache(task: Task, split_output=False) -> Task:
@@ -505,7 +727,8 @@ def create_task_cache(task: Task, split_output=False) -> Task:
     dir_path = CACHE_DIR / dir_name
     os.makedirs(dir_path, exist_ok=True)
     filepath = dir_path / "task.json"
-    timestamp = datetime.now().strftime(TIMESTAMP_FMT)
+    task.setdefault("command_str", join_command(task["command"]))
+    timestamp = time.strftime(TIMESTAMP_FMT)
     if split_output:
         stdout_path = dir_path / f"{dir_name}-{timestamp}.out"
         stderr_path = dir_path / f"{dir_name}-{timestamp}.err"
@@ -514,6 +737,7 @@ def create_task_cache(task: Task, split_output=False) -> Task:
                 "stdout": str(stdout_path),
                 "stderr": str(stderr_path),
                 "started_at": timestamp,
+                "started_at_epoch": int(time.time()),
             }
         )
     else:
@@ -522,13 +746,12 @@ def create_task_cache(task: Task, split_output=False) -> Task:
             {
                 "logs": str(logs_path),
                 "started_at": timestamp,
+                "started_at_epoch": int(time.time()),
             }
         )
     create_pidfile(task)
-    with open(filepath, "w") as f:
-        task_to_dump = dict(task)
-        task_to_dump.pop("pid", None)
-        json.dump(task_to_dump, f)
+    write_task_file(filepath, task)
+    invalidate_task_index()
     return task
 
 
@@ -537,55 +760,140 @@ def update_task_cache(task: Task):
     dir_path = CACHE_DIR / dir_name
     filepath = dir_path / "task.json"
     create_pidfile(task)
-    with open(filepath, "w") as f:
-        task_to_dump = dict(task)
-        task_to_dump.pop("pid", None)
-        json.dump(task_to_dump, f)
+    write_task_file(filepath, task)
 
 
 def is_task_running(task: Task) -> bool:
-    output = check_output(["ps", "-ax", "-o", "pid,args"], start_new_session=True)
-    for line in output.splitlines():
-        decoded = line.decode().strip()
-        ps_pid, cmdline = decoded.split(" ", 1)
-        if task.get("pid") is not None and ps_pid == task["pid"]:
-            return True
-    return False
+    """
+    Check whether the task's PID is alive. On Linux this reads /proc/<pid>
+    directly (a couple of syscalls) instead of forking a `ps` subprocess
+    on every call.
+    """
+    pid = task.get("pid")
+    if pid is None:
+        return False
+    if HAS_PROC:
+        proc_path = f"/proc/{pid}"
+        try:
+            if os.stat(proc_path).st_uid != os.getuid():
+                # PID was reused by another user's process
+                return False
+            with open(f"{proc_path}/cmdline", "rb") as f:
+                # A zombie process has an empty cmdline
+                return f.read() != b""
+        except (FileNotFoundError, ProcessLookupError):
+            return False
+    try:
+        os.kill(int(pid), 0)
+    except (ProcessLookupError, ValueError):
+        return False
+    except PermissionError:
+        # PID was reused by another user's process
+        return False
+    return True
+
+
+def running_pids() -> set:
+    """
+    Snapshot the set of live PIDs in a single scan so batch operations can
+    test membership instead of reading process state once per task.
+    """
+    if HAS_PROC:
+        return {name for name in os.listdir("/proc") if name.isdigit()}
+    output = check_output(["ps", "-ax", "-o", "pid="], start_new_session=True)
+    return {line.strip().decode() for line in output.splitlines()}
 
 
-def get_task_from_cache_file(cache_file_path: str):
-    with open(cache_file_path) as f:
-        task = json.load(f)
-    if task.get("pidfile") and Path(task["pidfile"]).exists():
+@lru_cache(maxsize=None)
+def load_task_file(cache_file_path: str, mtime_ns: int) -> Task:
+    # task.json is tiny; a raw fd read skips the buffered-reader setup
+    fd = os.open(cache_file_path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        data = os.read(fd, size)
+        while len(data) < size:
+            chunk = os.read(fd, size - len(data))
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        os.close(fd)
+    return json_loads(data)
+
+
+def get_task_from_cache_file(cache_file_path: str, load_pid: bool = True):
+    # Memoized by (path, mtime) so repeated lookups of the same task within
+    # one invocation don't re-read and re-parse the file. Callers mutate the
+    # returned dict, so hand out a copy.
+    mtime_ns = os.stat(cache_file_path).st_mtime_ns
+    task = dict(load_task_file(cache_file_path, mtime_ns))
+    if load_pid and task.get("pidfile") and Path(task["pidfile"]).exists():
         with open(task["pidfile"], "r") as f:
             task["pid"] = f.read()
+        task["_pidfile_pid"] = task["pid"]
     return task
 
 
-def find_task_by_name(name: str) -> Optional[Task]:
-    for filename in os.listdir(CACHE_DIR):
-        if filename not in RESERVED_FILE_NAMES and filename.split("-")[0] == name:
-            path = abspath(join(CACHE_DIR, filename, "task.json"))
-            return get_task_from_cache_file(path)
-    return None
+TASK_INDEX: Optional[Dict[str, Dict[str, str]]] = None
 
 
-def find_task_by_id(task_id: str) -> Optional[Dict]:
-    for filename in os.listdir(CACHE_DIR):
-        if filename in RESERVED_FILE_NAMES:
-            continue
-        try:
-            filename_split = filename.split("-")
+def invalidate_task_index():
+    global TASK_INDEX
+    TASK_INDEX = None
+
+
+def index_tasks() -> Dict[str, Dict[str, str]]:
+    """
+    Scan CACHE_DIR once and map task IDs and names to their directory names.
+    Avoids re-listing the directory (and re-splitting every filename) in each
+    lookup helper. The result is memoized for the process; creating or
+    removing a task invalidates it.
+    """
+    global TASK_INDEX
+    if TASK_INDEX is not None:
+        return TASK_INDEX
+    by_id: Dict[str, str] = {}
+    by_name: Dict[str, str] = {}
+    with os.scandir(CACHE_DIR) as entries:
+        for entry in entries:
+            if entry.name in RESERVED_FILE_NAMES:
+                continue
+            # Task caches are directories; this also skips stray files
+            # without an extra stat (scandir caches the dirent type)
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            filename_split = entry.name.rsplit("-", 1)
             if len(filename_split) == 1:
-                filename_task_id = filename_split[0]
+                by_id[filename_split[0]] = entry.name
             else:
-                filename_task_id = filename_split[1]
-            if filename_task_id == task_id:
-                path = abspath(join(CACHE_DIR, filename, "task.json"))
-                return get_task_from_cache_file(path)
-        except IndexError:
-            pass
-    return None
+                by_name[filename_split[0]] = entry.name
+                by_id[filename_split[1]] = entry.name
+    TASK_INDEX = {"by_id": by_id, "by_name": by_name}
+    return TASK_INDEX
+
+
+def find_task_by_name(
+    name: str, index: Optional[Dict] = None, load_pid: bool = True
+) -> Optional[Task]:
+    if index is None:
+        index = index_tasks()
+    filename = index["by_name"].get(name)
+    if filename is None:
+        return None
+    path = join(CACHE_DIR, filename, "task.json")
+    return get_task_from_cache_file(path, load_pid=load_pid)
+
+
+def find_task_by_id(
+    task_id: str, index: Optional[Dict] = None, load_pid: bool = True
+) -> Optional[Dict]:
+    if index is None:
+        index = index_tasks()
+    filename = index["by_id"].get(task_id)
+    if filename is None:
+        return None
+    path = join(CACHE_DIR, filename, "task.json")
+    return get_task_from_cache_file(path, load_pid=load_pid)
 
 
 def delete_pidfile(task: Task):
@@ -593,76 +901,105 @@ def delete_pidfile(task: Task):
         Path(task["pidfile"]).unlink(missing_ok=True)
 
 
-def remove_task_by_name(name: str):
+def remove_task_by_name(name: str, index: Optional[Dict] = None):
     with AtomicOpen(LOCK_PATH):
-        for filename in os.listdir(CACHE_DIR):
-            filename_split = filename.split("-")
-            if len(filename_split) == 1:
-                continue
-            else:
-                filename_task_name = filename_split[0]
-
-            if filename_task_name == name:
-                task = find_task_by_name(name)
-                if task is None:
-                    raise TtmException("Failed to find task by name")
-                if is_task_running(task):
-                    raise TtmException(
-                        "Cannot remove task while it's running.\n"
-                        "To stop it, run:\n"
-                        f"ttm stop {name}"
-                    )
-                dir_path = abspath(join(CACHE_DIR, filename))
-                rmtree(dir_path)
-                delete_pidfile(task)
-                return
-        raise TtmException(f"No task with name {name}")
+        if index is None:
+            index = index_tasks()
+        filename = index["by_name"].get(name)
+        if filename is None:
+            raise TtmException(f"No task with name {name}")
+        task = find_task_by_name(name, index=index)
+        if task is None:
+            raise TtmException("Failed to find task by name")
+        if is_task_running(task):
+            raise TtmException(
+                "Cannot remove task while it's running.\n"
+                "To stop it, run:\n"
+                f"ttm stop {name}"
+            )
+        dir_path = join(CACHE_DIR, filename)
+        rmtree(dir_path)
+        delete_pidfile(task)
+        invalidate_task_index()
 
 
-def remove_task_by_id(task_id: str):
+def remove_task_by_id(task_id: str, index: Optional[Dict] = None):
     with AtomicOpen(LOCK_PATH):
-        for filename in os.listdir(CACHE_DIR):
-            try:
-                filename_split = filename.split("-")
-                if len(filename_split) == 1:
-                    filename_task_id = filename_split[0]
-                else:
-                    filename_task_id = filename_split[1]
-
-                if filename_task_id == task_id:
-                    task = find_task_by_id(task_id)
-                    if task is None:
-                        raise TtmException("Failed to find task by id")
-                    if is_task_running(task):
-                        raise TtmException(
-                            "Cannot remove task while it's running.\n"
-                            "To stop it, run:\n"
-                            f"ttm stop {task_id}"
-                        )
-                    dir_path = abspath(join(CACHE_DIR, filename))
-                    rmtree(dir_path)
-                    delete_pidfile(task)
-                    return
-            except IndexError:
-                pass
-        raise TtmException(f"No task with ID {task_id}")
+        if index is None:
+            index = index_tasks()
+        filename = index["by_id"].get(task_id)
+        if filename is None:
+            raise TtmException(f"No task with ID {task_id}")
+        task = find_task_by_id(task_id, index=index)
+        if task is None:
+            raise TtmException("Failed to find task by id")
+        if is_task_running(task):
+            raise TtmException(
+                "Cannot remove task while it's running.\n"
+                "To stop it, run:\n"
+                f"ttm stop {task_id}"
+            )
+        dir_path = join(CACHE_DIR, filename)
+        rmtree(dir_path)
+        delete_pidfile(task)
+        invalidate_task_index()
+
+
+def generate_id(index: Optional[Dict] = None):
+    # Constant-time in the common case: a tiny counter file holds the next
+    # free ID. Callers hold the lock, so read-increment-write is safe.
+    if index is None:
+        index = index_tasks()
+    counter_path = join(CACHE_DIR, NEXT_ID_FILE_NAME)
+    if not index["by_id"]:
+        # No tasks left: restart numbering from 1
+        next_id = 1
+    else:
+        try:
+            with open(counter_path) as f:
+                next_id = int(f.read())
+        except (FileNotFoundError, ValueError):
+            next_id = None
+    if next_id is None or next_id >= 10000 or str(next_id) in index["by_id"]:
+        # Missing/corrupt counter or wrapped past the cap: recover by
+        # scanning for the first unused slot, like before
+        used = {int(task_id) for task_id in index["by_id"] if task_id.isdigit()}
+        for i in range(1, 10000):
+            if i not in used:
+                next_id = i
+                break
+        else:
+            raise TtmException("Failed to generated task ID")
+    with open(counter_path, "w") as f:
+        f.write(str(next_id + 1))
+    return str(next_id)
 
 
-def generate_id():
-    existing_ids = []
-    for filename in os.listdir(CACHE_DIR):
+def wait_for_task_exit(task: Task):
+    """
+    Block until the task's process exits. On Linux 5.3+ this waits on a
+    pidfd, which blocks in the kernel with no polling; elsewhere it polls
+    is_task_running with exponential backoff.
+    """
+    pid = int(task["pid"])
+    if hasattr(os, "pidfd_open"):
         try:
-            existing_ids.append(str(int(filename)))
-        except ValueError:
+            pidfd = os.pidfd_open(pid)
+        except ProcessLookupError:
+            return
+        except OSError:
+            # pidfd not supported by the kernel; fall back to polling
+            pidfd = None
+        if pidfd is not None:
             try:
-                existing_ids.append(str(int(filename.split("-")[1])))
-            except (ValueError, IndexError):
-                pass
-    for i in range(1, 10000):
-        str_i = str(i)
-        if str_i not in existing_ids:
-            return str_i
-    raise TtmException("Failed to generated task ID")
+                select([pidfd], [], [])
+            finally:
+                os.close(pidfd)
+            return
+    interval = 0.01
+    while is_task_running(task):
+        sleep(interval)
+        interval = min(interval * 2, BUSY_LOOP_INTERVAL)
 
 
 def get_child_pids(parent_pid: int):
@@ -683,6 +1020,44 @@ def kill_recursively(pid: int, sig: int):
     os.kill(pid, sig)
 
 
+def spawn_task_process(cmd, shell: bool, stdout_fd: int, stderr_fd: int) -> int:
+    """
+    Launch a tracked child in its own session with os.posix_spawn, which
+    avoids copying the parent's page tables the way plain fork does. The
+    caller must already be in the task's cwd (posix_spawn cannot chdir).
+    Falls back to Popen where posix_spawn or setsid support is missing.
+    """
+    if shell:
+        argv_list = ["/bin/sh", "-c", cmd]
+    else:
+        argv_list = list(cmd)
+    try:
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        try:
+            return os.posix_spawnp(
+                argv_list[0],
+                argv_list,
+                os.environ,
+                file_actions=[
+                    (os.POSIX_SPAWN_DUP2, devnull, 0),
+                    (os.POSIX_SPAWN_DUP2, stdout_fd, 1),
+                    (os.POSIX_SPAWN_DUP2, stderr_fd, 2),
+                ],
+                setsid=True,
+            )
+        finally:
+            os.close(devnull)
+    except (AttributeError, ValueError, NotImplementedError):
+        return Popen(
+            cmd,
+            shell=shell,
+            stdin=DEVNULL,
+            stdout=stdout_fd,
+            stderr=stderr_fd,
+            start_new_session=True,
+        ).pid
+
+
 #############
 # OPERATIONS
 
@@ -694,8 +1069,9 @@ def run(
     shell=False,
 ) -> Task:
     with AtomicOpen(LOCK_PATH):
+        index = index_tasks()
         if name is not None:
-            task = find_task_by_name(name)
+            task = find_task_by_name(name, index=index)
             if task:
                 if is_task_running(task):
                     raise TtmException(
@@ -707,12 +1083,14 @@ def run(
                     f"ttm rm {name}"
                 )
         task = {
-            "id": generate_id(),
+            "id": generate_id(index),
             "name": name,
             "cwd": os.getcwd(),
             "command": command,
             "shell": shell,
         }
+        # The task cache (with no PID yet) reserves the name and ID, so
+        # the spawn itself doesn't need to serialize concurrent runs
         if split_output:
             task = create_task_cache(task, split_output=split_output)
             stdout_path = task["stdout"]
@@ -723,38 +1101,40 @@ def run(
             stdout_path = ""
             stderr_path = ""
             logs_path = task["logs"]
-        if split_output:
-            with open(stdout_path, "wb") as out:
-                with open(stderr_path, "wb") as err:
-                    proc = Popen(
-                        build_cmd(command, shell),
-                        shell=shell,
-                        cwd=task["cwd"],
-                        stdin=DEVNULL,
-                        stdout=out,
-                        stderr=err,
-                        start_new_session=True,
-                    )
-        else:
-            with open(logs_path, "wb") as output:
-                proc = Popen(
-                    build_cmd(command, shell),
-                    shell=shell,
-                    cwd=task["cwd"],
-                    stdin=DEVNULL,
-                    stdout=output,
-                    stderr=output,
-                    start_new_session=True,
-                )
-        task["pid"] = str(proc.pid)
+
+    # Lock released; launch the child and re-lock briefly to record its PID
+    # run() always launches from the task's cwd (it was captured from
+    # getcwd above), so the chdir-free posix_spawn path applies
+    cmd = build_cmd(command, shell, task.get("command_str"))
+    # Raw fds: the parent never writes to the logs, so skip the buffered
+    # file objects entirely (0o666 is masked by the umask, like open())
+    log_flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    if split_output:
+        out_fd = os.open(stdout_path, log_flags, 0o666)
+        err_fd = os.open(stderr_path, log_flags, 0o666)
+    else:
+        out_fd = os.open(logs_path, log_flags, 0o666)
+        err_fd = out_fd
+    try:
+        pid = spawn_task_process(cmd, shell, out_fd, err_fd)
+    finally:
+        os.close(out_fd)
+        if err_fd != out_fd:
+            os.close(err_fd)
+    task["pid"] = str(pid)
+    with AtomicOpen(LOCK_PATH):
         update_task_cache(task)
-        return task
+    return task
 
 
-def start_task(task_id: Optional[str] = None, name: Optional[str] = None):
+def start_task(
+    task_id: Optional[str] = None,
+    name: Optional[str] = None,
+    index: Optional[Dict] = None,
+):
     with AtomicOpen(LOCK_PATH):
         if name is not None:
-            task = find_task_by_name(name)
+            task = find_task_by_name(name, index=index)
             if task is not None:
                 if is_task_running(task):
                     raise TtmException(
@@ -763,7 +1143,7 @@ def start_task(task_id: Optional[str] = None, name: Optional[str] = None):
             else:
                 raise TtmException(f"No task with name {name}")
         elif task_id is not None:
-            task = find_task_by_id(task_id)
+            task = find_task_by_id(task_id, index=index)
             if task is not None:
                 if is_task_running(task):
                     raise TtmException(
@@ -779,51 +1159,53 @@ def start_task(task_id: Optional[str] = None, name: Optional[str] = None):
         else:
             dir_name = task["id"]
         dir_path = CACHE_DIR / dir_name
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        timestamp = time.strftime(TIMESTAMP_FMT)
+        log_flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
         if task.get("stdout") is not None:
             task["stdout"] = str(dir_path / f"{dir_name}-{timestamp}.out")
             task["stderr"] = str(dir_path / f"{dir_name}-{timestamp}.err")
-            with open(task["stdout"], "wb") as out:
-                with open(task["stderr"], "wb") as err:
-                    proc = Popen(
-                        build_cmd(task["command"], task["shell"]),
-                        shell=task["shell"],
-                        cwd=task["cwd"],
-                        stdin=DEVNULL,
-                        stdout=out,
-                        stderr=err,
-                        start_new_session=True,
-                    )
+            out_fd = os.open(task["stdout"], log_flags, 0o666)
+            err_fd = os.open(task["stderr"], log_flags, 0o666)
         else:
             task["logs"] = str(dir_path / f"{dir_name}-{timestamp}.log")
-            with open(task["logs"], "wb") as output:
-                proc = Popen(
-                    build_cmd(task["command"], task["shell"]),
-                    shell=task["shell"],
-                    cwd=task["cwd"],
-                    stdin=DEVNULL,
-                    stdout=output,
-                    stderr=output,
-                    start_new_session=True,
-                )
+            out_fd = os.open(task["logs"], log_flags, 0o666)
+            err_fd = out_fd
+        try:
+            proc = Popen(
+                build_cmd(task["command"], task["shell"], task.get("command_str")),
+                shell=task["shell"],
+                cwd=task["cwd"],
+                stdin=DEVNULL,
+                stdout=out_fd,
+                stderr=err_fd,
+                start_new_session=True,
+            )
+        finally:
+            os.close(out_fd)
+            if err_fd != out_fd:
+                os.close(err_fd)
         task["pid"] = str(proc.pid)
         task["started_at"] = timestamp
+        task["started_at_epoch"] = int(time.time())
         update_task_cache(task)
 
 
 def stop_task(
-    task_id: Optional[str] = None, name: Optional[str] = None, sig: int = SIGTERM
+    task_id: Optional[str] = None,
+    name: Optional[str] = None,
+    sig: int = SIGTERM,
+    index: Optional[Dict] = None,
 ):
     with AtomicOpen(LOCK_PATH):
         if name is not None:
-            task = find_task_by_name(name)
+            task = find_task_by_name(name, index=index)
             if task is not None:
                 if not is_task_running(task):
                     raise TtmException(f"Task {name} is not running")
             else:
                 raise TtmException(f"No task with name {name}")
         elif task_id is not None:
-            task = find_task_by_id(task_id)
+            task = find_task_by_id(task_id, index=index)
             if task is not None:
                 if not is_task_running(task):
                     raise TtmException(f"Task with ID {task_id} is not running")
@@ -832,37 +1214,109 @@ def stop_task(
         else:
             raise ValueError("Either task_id or name must be set")
 
-    # We kill and busy wait outside the above file lock for better parallel performance
+    # We kill and wait outside the above file lock for better parallel
+    # performance, and only reacquire it once to clean up
     kill_recursively(int(task["pid"]), sig)
-    while True:
-        # TODO add timeout
-        with AtomicOpen(LOCK_PATH):
-            if not is_task_running(task):
+    wait_for_task_exit(task)
+    with AtomicOpen(LOCK_PATH):
+        delete_pidfile(task)
+
+
+def load_task_or_none(cache_file_path: str) -> Optional[Task]:
+    try:
+        return get_task_from_cache_file(cache_file_path)
+    except (NotADirectoryError, FileNotFoundError, ValueError):
+        return None
+
+
+def remove_tasks(targets: List[str]) -> bool:
+    """
+    Remove several tasks under one lock acquisition instead of locking
+    and re-resolving per target.
+    """
+    ok = True
+    to_remove = []
+    with AtomicOpen(LOCK_PATH):
+        index = index_tasks()
+        pids = running_pids()
+        for target in targets:
+            task_id, name = parse_task_id_or_name(target)
+            if task_id is not None:
+                filename = index["by_id"].get(task_id)
+                not_found = f"No task with ID {task_id}"
+            else:
+                filename = index["by_name"].get(name)
+                not_found = f"No task with name {name}"
+            if filename is None:
+                print_error(not_found)
+                ok = False
+                continue
+            task = load_task_or_none(join(CACHE_DIR, filename, "task.json"))
+            if task is None:
+                print_error(not_found)
+                ok = False
+                continue
+            if task.get("pid") in pids and is_task_running(task):
+                print_error(
+                    "Cannot remove task while it's running.\n"
+                    "To stop it, run:\n"
+                    f"ttm stop {target}"
+                )
+                ok = False
+                continue
+            to_remove.append((filename, task))
+        if to_remove:
+            invalidate_task_index()
+            for filename, task in to_remove:
+                try:
+                    rmtree(join(CACHE_DIR, filename))
+                except (NotADirectoryError, FileNotFoundError):
+                    pass
                 delete_pidfile(task)
-                break
-        sleep(BUSY_LOOP_INTERVAL)
+    return ok
 
 
 def remove_all_tasks():
     with AtomicOpen(LOCK_PATH):
-        for filename in os.listdir(CACHE_DIR):
+        index = index_tasks()
+        pids = running_pids()
+        filenames = list(index["by_id"].values())
+        if not filenames:
+            return
+        paths = [join(CACHE_DIR, f, "task.json") for f in filenames]
+        # Load all task files in parallel; the reads are I/O-bound
+        from multiprocessing.dummy import Pool as ThreadPool
+
+        with ThreadPool(min(32, len(paths))) as pool:
+            loaded = pool.map(load_task_or_none, paths)
+        invalidate_task_index()
+        to_remove = []
+        for filename, task in zip(filenames, loaded):
             if TERMINATE:
                 return
-            if filename in RESERVED_FILE_NAMES:
+            if task is None:
                 continue
-            path = abspath(join(CACHE_DIR, filename, "task.json"))
+            if task.get("pid") in pids and is_task_running(task):
+                print_error(f"Task {task['id']}: cannot remove while it's running")
+            else:
+                to_remove.append(join(CACHE_DIR, filename))
+        if not to_remove:
+            return
+
+        def rmtree_quiet(dir_path):
             try:
-                task = get_task_from_cache_file(path)
-                if is_task_running(task):
-                    print_error(f"Task {task['id']}: cannot remove while it's running")
-                else:
-                    dir_path = abspath(join(CACHE_DIR, filename))
-                    rmtree(dir_path)
-            except (NotADirectoryError, FileNotFoundError, ValueError):
+                rmtree(dir_path)
+            except (NotADirectoryError, FileNotFoundError):
                 pass
 
+        # Deleting the directories is unlink-bound; do it in parallel too
+        from multiprocessing.dummy import Pool as ThreadPool
+
+        with ThreadPool(min(8, len(to_remove))) as pool:
+            pool.map(rmtree_quiet, to_remove)
+
 
-def rm(task_name_or_id: Optional[str], rm_all=False) -> bool:
+def rm(task_name_or_id: Optional[str], rm_all=False, index: Optional[Dict] = None) -> bool:
     try:
         if rm_all:
             remove_all_tasks()
@@ -871,9 +1325,9 @@ def rm(task_name_or_id: Optional[str], rm_all=False) -> bool:
                 raise ValueError("task_name_or_id is None")
             task_id, name = parse_task_id_or_name(task_name_or_id)
             if task_id is not None:
-                remove_task_by_id(task_id)
+                remove_task_by_id(task_id, index=index)
             elif name is not None:
-                remove_task_by_name(name)
+                remove_task_by_name(name, index=index)
     except TtmException as e:
         print_error(str(e))
         return False
@@ -881,15 +1335,15 @@ def rm(task_name_or_id: Optional[str], rm_all=False) -> bool:
 
 
 def logs(task_name_or_id: str, follow=False, head=False):
-    def print_lines(lines):
+    def print_lines(lines, flush=True):
+        # One write per batch instead of two per line
         if isinstance(lines, list):
-            for line in lines:
-                stdout.buffer.write(line)
-                stdout.buffer.write("\n".encode())
+            if lines:
+                stdout.buffer.write(b"\n".join(lines) + b"\n")
         elif isinstance(lines, bytes):
-            stdout.buffer.write(lines)
-            stdout.buffer.write("\n".encode())
-        stdout.buffer.flush()
+            stdout.buffer.write(lines + b"\n")
+        if flush:
+            stdout.buffer.flush()
 
     if follow and head:
         raise TtmException("--follow and --head cannot be used together")
@@ -897,11 +1351,11 @@ def logs(task_name_or_id: str, follow=False, head=False):
     task_id, name = parse_task_id_or_name(task_name_or_id)
 
     if task_id is not None:
-        task = find_task_by_id(task_id)
+        task = find_task_by_id(task_id, load_pid=False)
         if task is None:
             raise TtmException(f"No task with ID {task_id}")
     elif name is not None:
-        task = find_task_by_name(name)
+        task = find_task_by_name(name, load_pid=False)
         if task is None:
             raise TtmException(f"No task with name {name}")
     else:
@@ -926,11 +1380,21 @@ def logs(task_name_or_id: str, follow=False, head=False):
             print_lines(Tailer(file).head(lines=line_count))
         elif follow:
             print_grey(f"{logs_path} followed tail:")
-            for line in Tailer(file, end=True).follow():
-                if line is None:
-                    time.sleep(0.01)
-                    continue
-                print_lines(line)
+            watcher = LogWatcher(logs_path)
+            try:
+                for line in Tailer(file, end=True).follow():
+                    if TERMINATE:
+                        break
+                    if line is None:
+                        # Flush what accumulated, then block until the
+                        # file changes
+                        stdout.buffer.flush()
+                        watcher.wait()
+                        continue
+                    print_lines(line, flush=False)
+            finally:
+                watcher.close()
+                stdout.buffer.flush()
         else:
             print_grey(f"{logs_path} last {line_count} lines:")
             print_lines(Tailer(file).tail(lines=line_count))
@@ -938,22 +1402,22 @@ def logs(task_name_or_id: str, follow=False, head=False):
         print_lines([])
 
 
-def start(task_name_or_id: str) -> bool:
+def start(task_name_or_id: str, index: Optional[Dict] = None) -> bool:
     task_id, name = parse_task_id_or_name(task_name_or_id)
 
     try:
-        start_task(task_id=task_id, name=name)
+        start_task(task_id=task_id, name=name, index=index)
         return True
     except TtmException as e:
         print_error(str(e))
         return False
 
 
-def stop(task_name_or_id: str, sig: int):
+def stop(task_name_or_id: str, sig: int, index: Optional[Dict] = None):
     task_id, name = parse_task_id_or_name(task_name_or_id)
 
     try:
-        stop_task(task_id=task_id, name=name, sig=sig)
+        stop_task(task_id=task_id, name=name, sig=sig, index=index)
         return True
     except TtmException as e:
         print_error(str(e))
@@ -962,58 +1426,82 @@ def stop(task_name_or_id: str, sig: int):
 
 def ls(ls_all=False, command: Optional[List[str]] = None):
     tasks = []
-    with AtomicOpen(LOCK_PATH):
-        for filename in os.listdir(CACHE_DIR):
-            if filename in RESERVED_FILE_NAMES:
-                continue
-            path = abspath(join(CACHE_DIR, filename, "task.json"))
+    with AtomicOpen(LOCK_PATH, shared=True):
+        index = index_tasks()
+        pids = running_pids()
+        wanted = None
+        if command:
+            # Parse each requested id/name once and filter with set
+            # lookups instead of re-parsing per directory entry
+            wanted = set()
+            for task_name_or_id in command:
+                task_id, name = parse_task_id_or_name(task_name_or_id)
+                wanted.add(task_id if task_id is not None else name)
+        to_list = []  # (path, force_list)
+        for filename in index["by_id"].values():
             force_list = False
-            if command:
-                for task_name_or_id in command:
-                    task_id, name = parse_task_id_or_name(task_name_or_id)
-                    filename_split = filename.split("-")
-                    if task_id in filename_split or name in filename_split:
-                        force_list = True
-                if not force_list:
+            if wanted is not None:
+                # Names can't contain dashes (NAME_RE), so one split
+                # yields exactly the id and name parts
+                if wanted.isdisjoint(filename.split("-", 1)):
                     continue
-            try:
-                task = get_task_from_cache_file(path)
-                task["started_at"] = datetime.strptime(
-                    task["started_at"], TIMESTAMP_FMT
-                )
-                if is_task_running(task):
-                    diff = datetime.now() - task["started_at"]
-                    task["uptime"] = format_seconds(int(diff.total_seconds()))
-                    tasks.append(task)
-                elif ls_all or force_list:
-                    task["pid"] = "-"
-                    task["uptime"] = "-"
-                    tasks.append(task)
-            except (NotADirectoryError, FileNotFoundError, ValueError):
-                pass
+                force_list = True
+            path = join(CACHE_DIR, filename, "task.json")
+            to_list.append((path, force_list))
+        loaded = []
+        if to_list:
+            # Load all task files in parallel; the reads are I/O-bound
+            from multiprocessing.dummy import Pool as ThreadPool
+
+            with ThreadPool(min(32, len(to_list))) as pool:
+                loaded = pool.map(load_task_or_none, [path for path, _ in to_list])
+        now = int(time.time())
+        for (path, force_list), task in zip(to_list, loaded):
+            if task is None:
+                continue
+            epoch = task.get("started_at_epoch")
+            if epoch is None:
+                # Tasks cached by older versions only have the string form
+                from datetime import datetime
+
+                try:
+                    epoch = int(
+                        datetime.strptime(
+                            task["started_at"], TIMESTAMP_FMT
+                        ).timestamp()
+                    )
+                except (KeyError, ValueError):
+                    continue
+                task["started_at_epoch"] = epoch
+            if task.get("pid") in pids and is_task_running(task):
+                task["uptime"] = format_seconds(now - epoch)
+                tasks.append(task)
+            elif ls_all or force_list:
+                task["pid"] = "-"
+                task["uptime"] = "-"
+                tasks.append(task)
 
     name_len_max = 4
     for task in tasks:
         if task["name"] is not None and len(task["name"]) > name_len_max:
             name_len_max = len(task["name"])
 
-    tasks = sorted(tasks, key=lambda d: d["started_at"])
+    tasks = sorted(tasks, key=lambda d: d["started_at_epoch"])
 
     columns = get_terminal_size((80, 20)).columns
     name_size = min(name_len_max, 16)
     command_size = columns - 21 - name_size
-    template = r"{0:4} {1:NAME_SIZE} {2:6} {3:7} {4:COMMAND_SIZE}"
-    template = template.replace("NAME_SIZE", str(name_size))
-    template = template.replace("COMMAND_SIZE", str(command_size))
-    print(template.format("ID", "NAME", "UPTIME", "PID", "COMMAND"))
+    fmt = f"{{0:4}} {{1:{name_size}}} {{2:6}} {{3:7}} {{4:{command_size}}}".format
+    print(fmt("ID", "NAME", "UPTIME", "PID", "COMMAND"))
     for task in tasks:
         print(
-            template.format(
+            fmt(
                 task["id"],
                 task["name"] or "-",
                 task["uptime"],
                 task["pid"],
-                shlex.join(task["command"]),
+                # Tasks cached by older versions don't have command_str
+                task.get("command_str") or join_command(task["command"]),
             )
         )
 
@@ -1022,12 +1510,22 @@ def ls(ls_all=False, command: Optional[List[str]] = None):
 # MISC
 
 
-def build_cmd(command: List[str], shell: bool):
+def join_command(command: List[str]) -> str:
+    # shlex.join runs quoting logic per argument; most commands contain
+    # nothing that needs quoting, so join them directly in that case
+    if all(SAFE_ARG_RE.match(arg) for arg in command):
+        return " ".join(command)
+    return shlex.join(command)
+
+
+def build_cmd(command: List[str], shell: bool, command_str: Optional[str] = None):
     if shell:
         if len(command) == 1:
             return command[0]
+        elif command_str is not None:
+            return command_str
         else:
-            return shlex.join(command)
+            return join_command(command)
     else:
         return command
 
@@ -1061,24 +1559,35 @@ def signals_list():
     return [str(sig.value) for sig in Signals]
 
 
+# Only color output going to a terminal; pipes and files get plain text
+STDOUT_IS_TTY = stdout.isatty()
+STDERR_IS_TTY = stderr.isatty()
+
+
+def colored(msg: str, color: str, file) -> str:
+    if STDERR_IS_TTY if file is stderr else STDOUT_IS_TTY:
+        return f"{color}{msg}{bcolors.ENDC}"
+    return msg
+
+
 def print_error(msg: str, *args, **kwargs):
     if "file" not in kwargs:
         kwargs["file"] = stderr
-    print(f"{bcolors.FAIL}{msg}{bcolors.ENDC}", *args, **kwargs)
+    print(colored(msg, bcolors.FAIL, kwargs["file"]), *args, **kwargs)
 
 
 def print_grey(msg: str, *args, **kwargs):
-    print(f"{bcolors.LIGHTGREY}{msg}{bcolors.ENDC}", *args, **kwargs)
+    print(colored(msg, bcolors.LIGHTGREY, kwargs.get("file")), *args, **kwargs)
 
 
 def print_warning(msg: str, *args, **kwargs):
     if "file" not in kwargs:
         kwargs["file"] = stderr
-    print(f"{bcolors.WARNING}{msg}{bcolors.ENDC}", *args, **kwargs)
+    print(colored(msg, bcolors.WARNING, kwargs["file"]), *args, **kwargs)
 
 
 def print_success(msg: str, *args, **kwargs):
-    print(f"{bcolors.OKGREEN}{msg}{bcolors.ENDC}", *args, **kwargs)
+    print(colored(msg, bcolors.OKGREEN, kwargs.get("file")), *args, **kwargs)
 
 
 def print_help():
@@ -1197,7 +1706,10 @@ def main():
             exit(1)
         global_args, option, option_args, command = parse_args(argv)
 
-        init_cache_dir(global_args.get("cache-dir"))
+        if option is not None:
+            # Only actual commands need the cache dir; --version/--help
+            # complete without touching the filesystem
+            init_cache_dir(global_args.get("cache-dir"))
 
         if option is None:
             if global_args.get("version"):
@@ -1243,9 +1755,7 @@ def main():
             else:
                 if command is None:
                     raise TtmException("Task ID or name must be provided")
-                pool = ThreadPool(len(command))
-                results = pool.map(rm, command)
-                if not all(results):
+                if not remove_tasks(command):
                     exit(1)
 
         elif option == "run":
@@ -1254,7 +1764,7 @@ def main():
                 return
             name = option_args.get("n") or option_args.get("name") or None
             if name is not None:
-                if not re.match(r"^[a-zA-Z_]+$", name):
+                if not NAME_RE.match(name):
                     raise TtmException(
                         "Only letters and underscore are allowed in task name"
                     )
@@ -1269,8 +1779,14 @@ def main():
                 return
             if command is None:
                 raise TtmException("Task ID or name must be provided")
-            pool = ThreadPool(len(command))
-            results = pool.map(start, command)
+            index = index_tasks()
+            if len(command) == 1:
+                results = [start(command[0], index)]
+            else:
+                from multiprocessing.dummy import Pool as ThreadPool
+
+                with ThreadPool(min(len(command), 8)) as pool:
+                    results = pool.starmap(start, [(c, index) for c in command])
             if not all(results):
                 exit(1)
 
@@ -1294,11 +1810,17 @@ def main():
                 stop_sig = SIGKILL
             if stop_sig is None:
                 stop_sig = SIGTERM
-            pool = ThreadPool(len(command))
-            arg_list = []
-            for c in command:
-                arg_list.append((c, stop_sig))
-            results = pool.starmap(stop, arg_list)
+            index = index_tasks()
+            if len(command) == 1:
+                results = [stop(command[0], stop_sig, index)]
+            else:
+                arg_list = []
+                for c in command:
+                    arg_list.append((c, stop_sig, index))
+                from multiprocessing.dummy import Pool as ThreadPool
+
+                with ThreadPool(min(len(command), 8)) as pool:
+                    results = pool.starmap(stop, arg_list)
             if not all(results):
                 exit(1)
 